@@ -3,6 +3,8 @@ import sys
 import os
 import json
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import csv
 from datetime import datetime
 import subprocess
@@ -11,18 +13,32 @@ DATA_DIR = "data"
 LOG_DIR = "log"
 LOG_FILE = os.path.join(LOG_DIR, "add-remove.log")
 COMBINED_DOMAINS_CSV = os.path.join(DATA_DIR, "combined_domains.csv")
+REQUEST_TIMEOUT = (3, 30)  # (connect, read) seconds; the list calls return full inventories
+
+# Shared keep-alive session for all DigiCert and Sectigo calls in a run.
+# Failed connections are retried for every method (nothing was sent yet);
+# read errors and 429/5xx responses are only retried for GET, so a DELETE
+# that succeeded server-side but returned a 502 is never resent.
+SESSION = requests.Session()
+SESSION.mount('https://', HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=4,
+    max_retries=Retry(total=3, backoff_factor=0.2, status_forcelist=[429, 500, 502, 503, 504],
+                      allowed_methods=frozenset(['GET']))
+))
 
 def ensure_dirs():
     for d in [DATA_DIR, LOG_DIR]:
-        if not os.path.exists(d):
-            os.makedirs(d)
+        os.makedirs(d, exist_ok=True)
 
 def delete_log():
-    if os.path.exists(LOG_FILE):
+    try:
         os.remove(LOG_FILE)
+    except FileNotFoundError:
+        pass
 
 def log_line(msg):
-    ensure_dirs()
+    # LOG_DIR is created once by ensure_dirs() at the start of main()
     with open(LOG_FILE, "a", encoding="utf-8") as logf:
         logf.write(msg + "\n")
 
@@ -56,14 +72,17 @@ def add_to_digicert(domain, api_key, organization_id):
         "dcv_method": "dns-cname-token"
     }
     try:
-        resp = requests.post(url, headers=headers, json=payload)
+        resp = SESSION.post(url, headers=headers, json=payload, timeout=REQUEST_TIMEOUT)
         try:
             resp_data = resp.json()
         except Exception:
             log_line(f"--- DigiCert-ADD: HTTP {resp.status_code}, body: {repr(resp.text)}")
             resp_data = {"error": "No JSON in response", "content": resp.text, "status_code": resp.status_code}
         log_json("DigiCert-ADD", domain, resp_data)
-        resp.raise_for_status()
+        if resp.status_code >= 400:
+            log_error("DigiCert-ADD", domain, f"HTTP {resp.status_code} {resp.reason}")
+            print(f"[DigiCert] ❌ ERROR creating domain '{domain}': HTTP {resp.status_code}")
+            return None
         print(f"[DigiCert] ✅ Added: {domain}")
         return resp_data
     except Exception as e:
@@ -75,14 +94,17 @@ def remove_from_digicert_by_id(domain_id, api_key, domain):
     url = f"https://www.digicert.com/services/v2/domain/{domain_id}"
     headers = {'X-DC-DEVKEY': api_key}
     try:
-        resp = requests.delete(url, headers=headers)
+        resp = SESSION.delete(url, headers=headers, timeout=REQUEST_TIMEOUT)
         try:
             data = resp.json()
         except Exception:
             log_line(f"--- DigiCert-REMOVE: HTTP {resp.status_code}, body: {repr(resp.text)}")
             data = {"error": "No JSON in response", "content": resp.text, "status_code": resp.status_code}
         log_json("DigiCert-REMOVE", domain, data)
-        resp.raise_for_status()
+        if resp.status_code >= 400:
+            log_error("DigiCert-REMOVE", domain, f"HTTP {resp.status_code} {resp.reason}")
+            print(f"[DigiCert] ❌ ERROR removing domain '{domain}': HTTP {resp.status_code}")
+            return None
         print(f"[DigiCert] 🗑️ Removed: {domain}")
         return True
     except Exception as e:
@@ -99,7 +121,7 @@ def remove_from_sectigo_by_id(domain_id, login, password, customer_uri, domain):
         'customerUri': customer_uri
     }
     try:
-        resp = requests.delete(url, headers=headers)
+        resp = SESSION.delete(url, headers=headers, timeout=REQUEST_TIMEOUT)
         if resp.status_code == 204:
             log_line(f"[Sectigo-REMOVE] HTTP 204: Domain '{domain}' successfully deleted.")
             print(f"[Sectigo] 🗑️ Removed: {domain} (ID {domain_id})")
@@ -139,14 +161,17 @@ def add_to_sectigo(domain, login, password, customer_uri, org_id):
         }]
     }
     try:
-        resp = requests.post(url, headers=headers, json=payload)
+        resp = SESSION.post(url, headers=headers, json=payload, timeout=REQUEST_TIMEOUT)
         try:
             resp_data = resp.json()
         except Exception:
             log_line(f"--- Sectigo-ADD: HTTP {resp.status_code}, body: {repr(resp.text)}")
             resp_data = {"error": "No JSON in response", "content": resp.text, "status_code": resp.status_code}
         log_json("Sectigo-ADD", domain, resp_data)
-        resp.raise_for_status()
+        if resp.status_code >= 400:
+            log_error("Sectigo-ADD", domain, f"HTTP {resp.status_code} {resp.reason}")
+            print(f"[Sectigo] ❌ ERROR creating domain '{domain}': HTTP {resp.status_code}")
+            return None
         print(f"[Sectigo] ✅ Added: {domain}")
         return resp_data
     except Exception as e:
@@ -163,7 +188,7 @@ def get_digicert_domain_details(domain_id, api_key):
         'Content-Type': 'application/json'
     }
     try:
-        resp = requests.get(url, headers=headers)
+        resp = SESSION.get(url, headers=headers, timeout=REQUEST_TIMEOUT)
         if resp.status_code == 200:
             return resp.json()
         log_line(f"[DigiCert-GET] Failed to get details for {domain_id}: {resp.status_code} {resp.text}")
@@ -174,22 +199,20 @@ def get_digicert_domain_details(domain_id, api_key):
 
 def verify_digicert_removal(domain, api_key):
     # Search for the domain in the list to confirm it is gone.
-    # Note: This assumes we can list domains. If the list is huge, this might be slow,
-    # but still likely faster than the full Get_CA_data.py if that script does much more.
+    # filters[search] lets DigiCert narrow the list server-side instead of
+    # returning the whole inventory; the exact-name match below still decides.
     url = "https://www.digicert.com/services/v2/domain"
     headers = {
         'X-DC-DEVKEY': api_key,
         'Content-Type': 'application/json'
     }
+    params = {'filters[search]': domain}
     try:
-        resp = requests.get(url, headers=headers)
+        resp = SESSION.get(url, headers=headers, params=params, timeout=REQUEST_TIMEOUT)
         if resp.status_code == 200:
-            domains = resp.json().get('domains', []) # Adjust structure if needed, assuming dict with list or list
-            if isinstance(domains, list):
-                # direct list
-                pass
-            elif isinstance(resp.json(), list):
-                domains = resp.json()
+            data = resp.json()
+            # Adjust structure if needed, assuming dict with list or list
+            domains = data if isinstance(data, list) else data.get('domains', [])
             
             found = False
             for d in domains:
@@ -216,7 +239,7 @@ def get_sectigo_domain_details(domain_id, login, password, customer_uri):
         'Content-Type': 'application/json'
     }
     try:
-        resp = requests.get(url, headers=headers)
+        resp = SESSION.get(url, headers=headers, timeout=REQUEST_TIMEOUT)
         if resp.status_code == 200:
             return resp.json()
         log_line(f"[Sectigo-GET] Failed to get details for {domain_id}: {resp.status_code} {resp.text}")
@@ -234,7 +257,7 @@ def verify_sectigo_removal(domain, login, password, customer_uri):
         'Content-Type': 'application/json'
     }
     try:
-        resp = requests.get(url, headers=headers)
+        resp = SESSION.get(url, headers=headers, timeout=REQUEST_TIMEOUT)
         if resp.status_code == 200:
             domains = resp.json() # Sectigo usually returns a list
             found = False
@@ -257,18 +280,21 @@ def verify_sectigo_removal(domain, login, password, customer_uri):
 # --- CSV lookup ---
 def find_domain_in_csv(domain, ca):
     """Return row from CSV for matching CA and domain, or None if not found."""
-    if not os.path.exists(COMBINED_DOMAINS_CSV):
+    # Normalize the search terms once rather than for every row
+    target_ca = ca.strip().lower()
+    target_domain = domain.strip().lower()
+    try:
+        csvfile = open(COMBINED_DOMAINS_CSV, newline='', encoding='utf-8')
+    except FileNotFoundError:
         print(f"CSV file not found: {COMBINED_DOMAINS_CSV}")
         return None
-    with open(COMBINED_DOMAINS_CSV, newline='', encoding='utf-8') as csvfile:
+    with csvfile:
         reader = csv.reader(csvfile)
         for row in reader:
             # Expected: CA,ID,domain,ACTIVE,TXT,expiry,provider/ERROR
             if len(row) < 3:
                 continue
-            ca_name = row[0].strip().lower()
-            csv_domain = row[2].strip().lower()
-            if ca_name == ca.strip().lower() and csv_domain == domain.strip().lower():
+            if row[0].strip().lower() == target_ca and row[2].strip().lower() == target_domain:
                 return row
     return None
 
@@ -291,11 +317,12 @@ def main():
 
     # Load credentials from ~/.ApiVault
     api_vault_path = os.path.expanduser('~/.ApiVault')
-    if not os.path.exists(api_vault_path):
+    try:
+        with open(api_vault_path, 'r') as f:
+            vault = json.load(f)
+    except FileNotFoundError:
         print(f"API vault file not found: {api_vault_path}")
         sys.exit(1)
-    with open(api_vault_path, 'r') as f:
-        vault = json.load(f)
 
     # DigiCert credentials
     digicert = vault.get('digicert') or {}
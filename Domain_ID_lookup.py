@@ -5,22 +5,35 @@ import json
 import csv
 import requests
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 # Configuration
 DATA_DIR = "data"
 OUTPUT_CSV = os.path.join(DATA_DIR, "domain_id_lookup.csv")
 API_VAULT_PATH = os.path.expanduser('~/.ApiVault')
+REQUEST_TIMEOUT = (3, 30)  # (connect, read) seconds; list pages can be slow
+SECTIGO_PAGE_SIZE = 200
+SECTIGO_PAGE_WAVE = 4  # Sectigo pages requested concurrently
+
+# One keep-alive session for the DigiCert list call and every Sectigo page.
+SESSION = requests.Session()
+SESSION.mount('https://', HTTPAdapter(
+    pool_maxsize=SECTIGO_PAGE_WAVE,
+    max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504])
+))
 
 def ensure_datadir():
-    if not os.path.exists(DATA_DIR):
-        os.makedirs(DATA_DIR)
+    os.makedirs(DATA_DIR, exist_ok=True)
 
 def load_vault():
-    if not os.path.exists(API_VAULT_PATH):
+    try:
+        with open(API_VAULT_PATH, 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
         print(f"Error: API vault file not found at {API_VAULT_PATH}")
         sys.exit(1)
-    with open(API_VAULT_PATH, 'r') as f:
-        return json.load(f)
 
 def get_digicert_domains(api_key):
     print("Fetching DigiCert domains...")
@@ -31,7 +44,7 @@ def get_digicert_domains(api_key):
     }
     domains = []
     try:
-        resp = requests.get(url, headers=headers)
+        resp = SESSION.get(url, headers=headers, timeout=REQUEST_TIMEOUT)
         if resp.status_code == 200:
             data = resp.json()
             # DigiCert response usually has a 'domains' key which is a list
@@ -55,6 +68,24 @@ def get_digicert_domains(api_key):
         print(f"  Exception: {e}")
     return domains
 
+def get_sectigo_page(base_url, headers, position, size):
+    """Returns the list of domain items starting at `position`, or None on error."""
+    try:
+        # Construct URL with pagination parameters
+        url = f"{base_url}?size={size}&position={position}"
+        resp = SESSION.get(url, headers=headers, timeout=REQUEST_TIMEOUT)
+        if resp.status_code != 200:
+            print(f"  Error: HTTP {resp.status_code} - {resp.text}")
+            return None
+        items = resp.json()
+        if not isinstance(items, list):
+            print(f"  Warning: Expected list, got {type(items)}")
+            return None
+        return items
+    except Exception as e:
+        print(f"  Exception fetching batch starting at {position}: {e}")
+        return None
+
 def get_sectigo_domains(login, password, customer_uri):
     print("Fetching Sectigo domains...")
     base_url = "https://cert-manager.com/api/domain/v1"
@@ -66,44 +97,40 @@ def get_sectigo_domains(login, password, customer_uri):
     }
     domains = []
     position = 0
-    size = 200
+    size = SECTIGO_PAGE_SIZE
+    # The first page is fetched alone since most inventories fit on it;
+    # after that, SECTIGO_PAGE_WAVE pages are requested at a time.
+    wave = 1
     
-    while True:
-        try:
-            # Construct URL with pagination parameters
-            url = f"{base_url}?size={size}&position={position}"
-            resp = requests.get(url, headers=headers)
-            
-            if resp.status_code == 200:
-                items = resp.json()
+    with ThreadPoolExecutor(max_workers=SECTIGO_PAGE_WAVE) as executor:
+        while True:
+            positions = [position + i * size for i in range(wave)]
+            pages = executor.map(lambda p: get_sectigo_page(base_url, headers, p, size), positions)
+            finished = False
+            # Pages are consumed in order, so the first error, empty page or
+            # short page ends the walk exactly like the sequential version.
+            for items in pages:
                 if not items:
+                    finished = True
                     break
-                    
-                if isinstance(items, list):
-                    batch_count = 0
-                    for item in items:
-                        d_id = item.get('id')
-                        d_name = item.get('name')
-                        if d_id and d_name:
-                            domains.append({'id': d_id, 'domain': d_name, 'ca': 'Sectigo'})
-                            batch_count += 1
-                    
-                    print(f"  Fetched {len(items)} items (Total so far: {len(domains)})")
-                    
-                    # If we got fewer items than requested, we are at the end
-                    if len(items) < size:
-                        break
-                        
-                    position += size
-                else:
-                    print(f"  Warning: Expected list, got {type(items)}")
+
+                for item in items:
+                    d_id = item.get('id')
+                    d_name = item.get('name')
+                    if d_id and d_name:
+                        domains.append({'id': d_id, 'domain': d_name, 'ca': 'Sectigo'})
+                
+                print(f"  Fetched {len(items)} items (Total so far: {len(domains)})")
+                
+                # If we got fewer items than requested, we are at the end
+                if len(items) < size:
+                    finished = True
                     break
-            else:
-                print(f"  Error: HTTP {resp.status_code} - {resp.text}")
+
+            if finished:
                 break
-        except Exception as e:
-            print(f"  Exception fetching batch starting at {position}: {e}")
-            break
+            position += wave * size
+            wave = SECTIGO_PAGE_WAVE
             
     print(f"  Total Sectigo domains found: {len(domains)}")
     return domains
@@ -112,12 +139,10 @@ def save_to_csv(all_domains):
     ensure_datadir()
     try:
         print(f"Saving {len(all_domains)} records to {OUTPUT_CSV}...")
-        with open(OUTPUT_CSV, 'w', newline='', encoding='utf-8') as csvfile:
-            fieldnames = ['id', 'domain', 'CA']
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            writer.writeheader()
-            for d in all_domains:
-                writer.writerow({'id': d['id'], 'domain': d['domain'], 'CA': d['ca']})
+        with open(OUTPUT_CSV, 'w', newline='', encoding='utf-8', buffering=1 << 20) as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(['id', 'domain', 'CA'])
+            writer.writerows((d['id'], d['domain'], d['ca']) for d in all_domains)
         print("Done.")
     except Exception as e:
         print(f"Error writing CSV: {e}")
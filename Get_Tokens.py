@@ -5,6 +5,10 @@ import os
 import sys
 import datetime
 import requests
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from digicert_rate_limit import DIGICERT_LIMITER
 
 # Base configuration
 DATA_DIR = "data"
@@ -14,18 +18,35 @@ INPUT_FILE = os.path.join(DATA_DIR, "combined_domains.csv")
 # Safest is to read all, process, and write back.
 OUTPUT_FILE = os.path.join(DATA_DIR, "combined_domains.csv")
 API_VAULT_PATH = os.path.expanduser('~/.ApiVault')
+REQUEST_TIMEOUT = (3, 15)  # (connect, read) seconds
+MAX_WORKERS = 8
+
+# One keep-alive session for every DigiCert/Sectigo call so each domain
+# reuses the pooled TLS connection instead of handshaking again.
+SESSION = requests.Session()
+SESSION.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=MAX_WORKERS,
+                                      max_retries=Retry(total=2, backoff_factor=0.3)))
 
 def ensure_dirs():
-    if not os.path.exists(LOG_DIR):
-        os.makedirs(LOG_DIR)
+    os.makedirs(LOG_DIR, exist_ok=True)
+
+_vault_cache = None
+
+def load_vault():
+    """Reads and parses the API vault once; later calls reuse the parsed data."""
+    global _vault_cache
+    if _vault_cache is None:
+        try:
+            with open(API_VAULT_PATH, 'r') as f:
+                _vault_cache = json.load(f)
+        except FileNotFoundError:
+            print(f"Error: API vault not found at {API_VAULT_PATH}")
+            sys.exit(1)
+    return _vault_cache
 
 def load_digicert_api_key():
-    if not os.path.exists(API_VAULT_PATH):
-        print(f"Error: API vault not found at {API_VAULT_PATH}")
-        sys.exit(1)
     try:
-        with open(API_VAULT_PATH, 'r') as f:
-            data = json.load(f)
+        data = load_vault()
         key = data.get('digicert', {}).get('api')
         if not key:
             print("Error: Digicert API key not found in vault")
@@ -59,7 +80,8 @@ def change_dcv_method(domain_id, api_key):
     payload = {"dcv_method": "dns-cname-token"}
     
     try:
-        resp = requests.put(url, headers=headers, json=payload)
+        DIGICERT_LIMITER.acquire()
+        resp = SESSION.put(url, headers=headers, json=payload, timeout=REQUEST_TIMEOUT)
         # Log response
         log_name = f"dcv_method_change_{domain_id}.log"
         if resp.status_code in [200, 201, 204]:
@@ -79,7 +101,8 @@ def get_dcv_token(domain_id, api_key):
         'Content-Type': 'application/json'
     }
     try:
-        resp = requests.post(url, headers=headers)
+        DIGICERT_LIMITER.acquire()
+        resp = SESSION.post(url, headers=headers, timeout=REQUEST_TIMEOUT)
         # Log response
         log_name = f"dcv_token_{domain_id}.log"
         if resp.status_code in [200, 201]:
@@ -94,12 +117,8 @@ def get_dcv_token(domain_id, api_key):
         return None
 
 def load_sectigo_credentials():
-    if not os.path.exists(API_VAULT_PATH):
-        print(f"Error: API vault not found at {API_VAULT_PATH}")
-        sys.exit(1)
     try:
-        with open(API_VAULT_PATH, 'r') as f:
-            data = json.load(f)
+        data = load_vault()
         sectigo = data.get('Sectigo', {})
         if not sectigo:
              print("Error: Sectigo section not found in vault")
@@ -134,7 +153,7 @@ def process_sectigo_domain(domain, creds):
     payload = {"domain": domain}
     
     try:
-        resp = requests.post(url, headers=headers, json=payload)
+        resp = SESSION.post(url, headers=headers, json=payload, timeout=REQUEST_TIMEOUT)
         log_name = f"sectigo_dcv_{domain}.log"
         
         if resp.status_code == 200:
@@ -148,24 +167,75 @@ def process_sectigo_domain(domain, creds):
         log_to_file("errors.log", f"Exception processing Sectigo domain {domain}: {e}")
         return None
 
+def process_row(row, digicert_key, sectigo_creds):
+    """Requests the DCV token for one combined_domains.csv row, updating the row in place."""
+    provider = row.get('provider', '')
+    domain_name = row.get('name', '')
+
+    # Digicert Logic
+    if provider.lower() == 'digicert':
+        dcv_method = row.get('dcv_method', 'OTHER')
+        domain_id = row.get('id')
+        
+        print(f"Processing Digicert Domain: {domain_name} (ID: {domain_id})")
+        
+        is_ready_for_token = False
+        
+        if dcv_method != 'CNAME':
+            print(f"  Attempting to change DCV method for {domain_name}...")
+            success = change_dcv_method(domain_id, digicert_key)
+            if success:
+                row['dcv_method'] = 'CNAME'
+                is_ready_for_token = True
+            else:
+                print(f"  Failed to set DCV method for {domain_id}")
+        else:
+            is_ready_for_token = True
+            
+        if is_ready_for_token:
+            token_data = get_dcv_token(domain_id, digicert_key)
+            if token_data:
+                row['Value'] = token_data.get('verification_value', '')
+                row['token'] = token_data.get('token', '')
+                print(f"  Token retrieved for {domain_name}")
+            else:
+                print(f"  Failed to retrieve token for {domain_name}")
+
+    # Sectigo Logic
+    elif provider.lower() == 'sectigo':
+        print(f"Processing Sectigo Domain: {domain_name}")
+        # For Sectigo, we just call the start/domain/cname endpoint
+        # It returns the host/point values directly
+        
+        sectigo_data = process_sectigo_domain(domain_name, sectigo_creds)
+        if sectigo_data:
+            # "return json from host into Value and point to token"
+            row['Value'] = sectigo_data.get('host', '')
+            row['token'] = sectigo_data.get('point', '')
+            # Should we update dcv_method to CNAME? The call is literally start/domain/cname
+            row['dcv_method'] = 'CNAME' 
+            print(f"  Token retrieved for {domain_name}")
+        else:
+             print(f"  Failed to retrieve token for {domain_name}")
+
 def main():
     ensure_dirs()
     digicert_key = load_digicert_api_key()
     sectigo_creds = load_sectigo_credentials()
-    
-    if not os.path.exists(INPUT_FILE):
-        print(f"Error: Input file {INPUT_FILE} does not exist.")
-        sys.exit(1)
 
     rows = []
     fieldnames = []
     
     print(f"Reading {INPUT_FILE}...")
-    with open(INPUT_FILE, 'r', newline='') as f:
+    try:
+        f = open(INPUT_FILE, 'r', newline='')
+    except FileNotFoundError:
+        print(f"Error: Input file {INPUT_FILE} does not exist.")
+        sys.exit(1)
+    with f:
         reader = csv.DictReader(f)
         fieldnames = reader.fieldnames
-        for row in reader:
-            rows.append(row)
+        rows = list(reader)
 
     # Add new columns if they don't exist
     if 'Value' not in fieldnames:
@@ -173,72 +243,22 @@ def main():
     if 'token' not in fieldnames:
         fieldnames.append('token')
 
-    updated_rows = []
-    
     print(f"Processing {len(rows)} domains...")
     
     # Test case filter
     
-    
-    for row in rows:
-        provider = row.get('provider', '')
-        domain_name = row.get('name', '')
-        
-
-
-        # Digicert Logic
-        if provider.lower() == 'digicert':
-            dcv_method = row.get('dcv_method', 'OTHER')
-            domain_id = row.get('id')
-            
-            print(f"Processing Digicert Domain: {domain_name} (ID: {domain_id})")
-            
-            is_ready_for_token = False
-            
-            if dcv_method != 'CNAME':
-                print(f"  Attempting to change DCV method for {domain_name}...")
-                success = change_dcv_method(domain_id, digicert_key)
-                if success:
-                    row['dcv_method'] = 'CNAME'
-                    is_ready_for_token = True
-                else:
-                    print(f"  Failed to set DCV method for {domain_id}")
-            else:
-                is_ready_for_token = True
-                
-            if is_ready_for_token:
-                token_data = get_dcv_token(domain_id, digicert_key)
-                if token_data:
-                    row['Value'] = token_data.get('verification_value', '')
-                    row['token'] = token_data.get('token', '')
-                    print(f"  Token retrieved for {domain_name}")
-                else:
-                    print(f"  Failed to retrieve token for {domain_name}")
-
-        # Sectigo Logic
-        elif provider.lower() == 'sectigo':
-            print(f"Processing Sectigo Domain: {domain_name}")
-            # For Sectigo, we just call the start/domain/cname endpoint
-            # It returns the host/point values directly
-            
-            sectigo_data = process_sectigo_domain(domain_name, sectigo_creds)
-            if sectigo_data:
-                # "return json from host into Value and point to token"
-                row['Value'] = sectigo_data.get('host', '')
-                row['token'] = sectigo_data.get('point', '')
-                # Should we update dcv_method to CNAME? The call is literally start/domain/cname
-                row['dcv_method'] = 'CNAME' 
-                print(f"  Token retrieved for {domain_name}")
-            else:
-                 print(f"  Failed to retrieve token for {domain_name}")
-        
-        updated_rows.append(row)
+    # Each row is independent, so fetch tokens concurrently; rows are
+    # updated in place and written back in their original order.
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        # list() drains the results so any worker exception is raised here
+        list(executor.map(lambda row: process_row(row, digicert_key, sectigo_creds), rows))
 
     print(f"Writing updates to {OUTPUT_FILE}...")
     with open(OUTPUT_FILE, 'w', newline='') as f:
         writer = csv.DictWriter(f, fieldnames=fieldnames)
         writer.writeheader()
-        writer.writerows(updated_rows)
+        # Rows were updated in place above
+        writer.writerows(rows)
     print("Done.")
 
 if __name__ == "__main__":
@@ -3,24 +3,43 @@ import requests
 import json
 import csv
 import os
+import re
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from digicert_rate_limit import DIGICERT_LIMITER
 
 # Configuration
 DATA_DIR = "data"
 INPUT_CSV = os.path.join(DATA_DIR, "domain_id_lookup.csv")
 OUTPUT_FILE = os.path.join(DATA_DIR, "digicert_domains.csv")
 API_VAULT_PATH = os.path.expanduser('~/.ApiVault')
+REQUEST_TIMEOUT = (3, 10)  # (connect, read) seconds
+MAX_WORKERS = 16
+RATE_LIMIT_RETRIES = 3  # 429 retries, each waiting for a fresh limiter token
+
+# Shared keep-alive session; worker threads draw connections from its pool.
+# 429 is left out of status_forcelist: get_domain_details retries it itself
+# so every resend goes back through DIGICERT_LIMITER.
+SESSION = requests.Session()
+SESSION.mount('https://', HTTPAdapter(
+    pool_connections=MAX_WORKERS,
+    pool_maxsize=MAX_WORKERS,
+    max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[500, 502, 503, 504])
+))
 
 def ensure_datadir():
-    if not os.path.exists(DATA_DIR):
-        os.makedirs(DATA_DIR)
+    os.makedirs(DATA_DIR, exist_ok=True)
 
 def load_credentials():
-    if not os.path.exists(API_VAULT_PATH):
+    try:
+        with open(API_VAULT_PATH, 'r') as f:
+            data = json.load(f)
+    except FileNotFoundError:
         print(f"Error: API vault not found at {API_VAULT_PATH}")
         sys.exit(1)
-    with open(API_VAULT_PATH, 'r') as f:
-        data = json.load(f)
     
     digicert = data.get('digicert')
     if not digicert:
@@ -38,15 +57,18 @@ def load_credentials():
     
     return api_key, customer_id
 
-def get_domain_details(domain_id, api_key):
+def get_domain_details(domain_id):
     # Added include_dcv and include_validation as requested
+    # Auth headers are set once on SESSION in main()
     url = f"https://www.digicert.com/services/v2/domain/{domain_id}?include_dcv=true&include_validation=true"
-    headers = {
-        'X-DC-DEVKEY': api_key,
-        'Content-Type': 'application/json'
-    }
     try:
-        resp = requests.get(url, headers=headers)
+        for attempt in range(RATE_LIMIT_RETRIES + 1):
+            DIGICERT_LIMITER.acquire()
+            resp = SESSION.get(url, timeout=REQUEST_TIMEOUT)
+            if resp.status_code != 429 or attempt == RATE_LIMIT_RETRIES:
+                break
+            retry_after = resp.headers.get('Retry-After', '')
+            time.sleep(min(int(retry_after), 30) if retry_after.isdigit() else 1)
         if resp.status_code == 200:
             return resp.json()
         print(f"Warning: Failed to get details for {domain_id}: {resp.status_code}")
@@ -56,36 +78,47 @@ def get_domain_details(domain_id, api_key):
         return None
 
 def read_lookup_csv():
-    if not os.path.exists(INPUT_CSV):
+    """Returns (id, domain) tuples for the DigiCert rows of the lookup CSV."""
+    domains_to_check = []
+    try:
+        f = open(INPUT_CSV, 'r', encoding='utf-8')
+    except FileNotFoundError:
         print(f"Error: Input file {INPUT_CSV} not found.")
         sys.exit(1)
-    
-    domains_to_check = []
-    with open(INPUT_CSV, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
+    with f:
+        reader = csv.reader(f)
+        # Expected schema: id,domain,CA
+        header = next(reader, [])
+        try:
+            id_idx, dom_idx, ca_idx = header.index('id'), header.index('domain'), header.index('CA')
+        except ValueError as e:
+            print(f"Error: Missing column in {INPUT_CSV}: {e}")
+            sys.exit(1)
+        width = max(id_idx, dom_idx, ca_idx)
         for row in reader:
-            # Expected schema: id,domain,CA
-            ca = row.get('CA', '').strip()
-            if ca.lower() == 'digicert':
-                domains_to_check.append(row)
+            if len(row) > width and row[ca_idx].strip().lower() == 'digicert':
+                domains_to_check.append((row[id_idx], row[dom_idx]))
     return domains_to_check
 
+DCV_METHOD_RE = re.compile(r'dns-cname-token|dns-txt-token|email', re.IGNORECASE)
+# Checked in this order when a value names more than one method
+DCV_METHOD_MAP = {
+    'dns-cname-token': 'CNAME',
+    'dns-txt-token': 'TXT',
+    'email': 'EMAIL'
+}
+
 def map_dcv_method(method):
-    if not method:
-        return "OTHER"
-    l_method = method.lower()
-    if 'dns-cname-token' in l_method:
-        return 'CNAME'
-    elif 'dns-txt-token' in l_method:
-        return 'TXT'
-    elif 'email' in l_method:
-        return 'EMAIL'
-    else:
-        return 'OTHER'
+    matches = {m.lower() for m in DCV_METHOD_RE.findall(method or '')}
+    return next((name for key, name in DCV_METHOD_MAP.items() if key in matches), 'OTHER')
 
 def main():
     ensure_datadir()
     api_key, customer_id = load_credentials()
+    SESSION.headers.update({
+        'X-DC-DEVKEY': api_key,
+        'Content-Type': 'application/json'
+    })
     
     if customer_id:
         print(f"Filtering for Customer ID: {customer_id}")
@@ -93,21 +126,31 @@ def main():
     domains_list = read_lookup_csv()
     print(f"Found {len(domains_list)} Digicert domains in lookup CSV.")
     
-    final_data = []
-    
-    # Header: id,name,active,dcv_method,Expiration
-    
-    for entry in domains_list:
-        d_id = entry.get('id')
-        d_name_csv = entry.get('domain')
-        
-        if not d_id:
-            continue
-            
-        print(f"Fetching details for ID {d_id} ({d_name_csv})...")
-        details = get_domain_details(d_id, api_key)
-        
-        if details:
+    # The lookup CSV can list an ID more than once; fetch each ID only once.
+    seen_ids = set()
+    entries = []
+    for d_id, d_name_csv in domains_list:
+        if d_id and d_id not in seen_ids:
+            seen_ids.add(d_id)
+            entries.append((d_id, d_name_csv))
+    print(f"Fetching details for {len(entries)} domains ({MAX_WORKERS} concurrent requests)...")
+    print(f"Writing results to {OUTPUT_FILE}...")
+
+    with open(OUTPUT_FILE, 'w', newline='', encoding='utf-8') as f, \
+            ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        writer = csv.writer(f)
+        writer.writerow(['id', 'name', 'active', 'dcv_method', 'Expiration'])
+
+        # Fetch concurrently; map() yields results in input order so the
+        # output CSV stays stable between runs, and each row is written
+        # as soon as its details arrive (flushed to disk at the default
+        # buffer size, not held until the run ends).
+        results = executor.map(get_domain_details, (d_id for d_id, _ in entries))
+        for (d_id, d_name_csv), details in zip(entries, results):
+            if not details:
+                print(f"Skipping {d_id} due to API error/missing data.")
+                continue
+
             if customer_id:
                 org = details.get('organization', {})
                 org_id = str(org.get('id', ''))
@@ -138,23 +181,7 @@ def main():
             # Name (prefer API name, fallback to CSV)
             api_name = details.get('name') or details.get('common_name') or d_name_csv
             
-            final_data.append({
-                'id': d_id,
-                'name': api_name,
-                'active': active_str,
-                'dcv_method': dcv_method_str,
-                'Expiration': expiration_date
-            })
-        else:
-            print(f"Skipping {d_id} due to API error/missing data.")
-
-    print(f"Writing results to {OUTPUT_FILE}...")
-    with open(OUTPUT_FILE, 'w', newline='', encoding='utf-8') as f:
-        fieldnames = ['id', 'name', 'active', 'dcv_method', 'Expiration']
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        writer.writeheader()
-        for row in final_data:
-            writer.writerow(row)
+            writer.writerow([d_id, api_name, active_str, dcv_method_str, expiration_date])
             
     print("Done.")
 
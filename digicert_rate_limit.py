@@ -0,0 +1,35 @@
+import threading
+import time
+
+# DigiCert allows 1000 requests per 5 minutes per API key (plus a short-term
+# burst cap). Every script that calls DigiCert concurrently acquires from
+# DIGICERT_LIMITER so its workers stay just under that quota. The limiter is
+# per process: running Get_Tokens.py or Add_Remove_domain.py while
+# digicert_get_domains.py is still going shares the quota without sharing the
+# limiter, so avoid overlapping them or lower the rate.
+DIGICERT_RATE_LIMIT = 3  # requests per second
+DIGICERT_BURST = 20
+
+class RateLimiter:
+    """Thread-safe token bucket: allows `burst` calls at once, then `rate` calls per second."""
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Blocks until a request may be sent."""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+DIGICERT_LIMITER = RateLimiter(DIGICERT_RATE_LIMIT, DIGICERT_BURST)
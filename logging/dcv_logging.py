@@ -8,11 +8,16 @@ from typing import Optional, Any
 import os
 import glob
 import time
+import threading
 
-def cleanup_old_logs(log_dir: str, retention_days: int = 14):
+CLEANUP_INTERVAL_SECONDS = 86400
+CLEANUP_SENTINEL = ".last_cleanup"
+
+def cleanup_old_logs(log_dir: str, retention_days: int = 14, active_log: Optional[str] = None):
     """
     Removes log files in the specified directory that are older than the retention period.
-    Assumes log files start with 'dcv_process.log'.
+    Assumes log files start with 'dcv_process.log'. active_log, the file the handler
+    is writing to, is never removed.
     """
     try:
         # Construct the pattern to match log files
@@ -21,8 +26,11 @@ def cleanup_old_logs(log_dir: str, retention_days: int = 14):
         
         # Calculate the cutoff time
         cutoff_time = time.time() - (retention_days * 86400)
+        active_path = os.path.abspath(active_log) if active_log else None
         
         for log_file in glob.glob(log_pattern):
+            if os.path.abspath(log_file) == active_path:
+                continue
             if os.path.isfile(log_file):
                 file_mtime = os.path.getmtime(log_file)
                 if file_mtime < cutoff_time:
@@ -34,6 +42,28 @@ def cleanup_old_logs(log_dir: str, retention_days: int = 14):
     except Exception as e:
         print(f"Error during log cleanup: {e}")
 
+def schedule_log_cleanup(log_dir: str, retention_days: int = 14, active_log: Optional[str] = None):
+    """
+    Runs cleanup_old_logs in a daemon thread, at most once per CLEANUP_INTERVAL_SECONDS.
+    A sentinel file in log_dir records the last run so process startup skips the scan.
+    """
+    sentinel = os.path.join(log_dir, CLEANUP_SENTINEL)
+    try:
+        if time.time() - os.path.getmtime(sentinel) < CLEANUP_INTERVAL_SECONDS:
+            return
+    except OSError:
+        pass  # No sentinel yet (or unreadable): run the cleanup
+
+    def _cleanup():
+        cleanup_old_logs(log_dir, retention_days, active_log)
+        try:
+            with open(sentinel, 'a'):
+                os.utime(sentinel, None)
+        except OSError as e:
+            print(f"Failed to update cleanup sentinel {sentinel}: {e}")
+
+    threading.Thread(target=_cleanup, name="dcv-log-cleanup", daemon=True).start()
+
 # Configure the logger
 def setup_logger(log_file: str = '../log/dcv_process.log', max_bytes: int = 10_000_000, backup_count: int = 5, retention_days: int = 14):
     logger = logging.getLogger("dcv_logger")
@@ -50,7 +80,9 @@ def setup_logger(log_file: str = '../log/dcv_process.log', max_bytes: int = 10_0
     if not log_dir: # Handle case where log_file is just a filename
         log_dir = os.getcwd()
     
-    cleanup_old_logs(log_dir, retention_days)
+    # The handler below opens log_file while the cleanup thread may still be
+    # scanning, so the live file is excluded from deletion.
+    schedule_log_cleanup(log_dir, retention_days, active_log=log_file)
 
     if not logger.hasHandlers():
         logger.setLevel(logging.INFO)
@@ -76,21 +108,27 @@ def log_execution(func):
     return wrapper
 
 def log_json_response(response: Any, context: Optional[str] = None):
-    """Log JSON API responses."""
+    """Log JSON API responses. Compact at INFO; pretty-printed only when DEBUG is enabled."""
+    if not logger.isEnabledFor(logging.INFO):
+        return
     try:
         if isinstance(response, str):
             response_obj = json.loads(response)
         else:
             response_obj = response
-        msg = f"API Response{f' ({context})' if context else ''}: {json.dumps(response_obj, indent=2)}"
+        if logger.isEnabledFor(logging.DEBUG):
+            payload = json.dumps(response_obj, indent=2)
+        else:
+            payload = json.dumps(response_obj, separators=(',', ':'))
+        msg = f"API Response{f' ({context})' if context else ''}: {payload}"
         logger.info(msg)
     except Exception as e:
         logger.error(f"Failed to log JSON response: {str(e)}")
 
 def run_and_log_command(command: list, context: Optional[str] = None):
     """
-    Run a shell command (e.g., dig) and log output/error.
-    Usage: run_and_log_command(['dig', 'github.com'])
+    Run a shell command and log output/error. For DNS lookups use resolve_and_log.
+    Usage: run_and_log_command(['whois', 'github.com'])
     """
     cmd_str = ' '.join(command)
     logger.info(f"Running command{f' ({context})' if context else ''}: {cmd_str}")
@@ -103,6 +141,29 @@ def run_and_log_command(command: list, context: Optional[str] = None):
         logger.error(f"Stderr: {e.stderr.strip()}")
         return None
 
+_resolver = None
+
+def resolve_and_log(name: str, rdtype: str = 'A', context: Optional[str] = None):
+    """
+    Resolve a DNS name in-process and log the answer; use instead of running dig.
+    Needs dnspython, which is only imported on first use.
+    Usage: resolve_and_log('github.com', 'NS')
+    """
+    global _resolver
+    query_str = f"{name} {rdtype}"
+    logger.info(f"Resolving{f' ({context})' if context else ''}: {query_str}")
+    try:
+        if _resolver is None:
+            import dns.resolver
+            _resolver = dns.resolver.Resolver()
+        answer = _resolver.resolve(name, rdtype)
+        records = [rr.to_text() for rr in answer]
+        logger.info(f"DNS Answer [{query_str}]:\n" + "\n".join(records))
+        return records
+    except Exception as e:
+        logger.error(f"DNS query '{query_str}' failed: {e}")
+        return None
+
 # Example usage in a script:
 if __name__ == "__main__":
     @log_execution
@@ -113,13 +174,13 @@ if __name__ == "__main__":
         return api_response
 
     @log_execution
-    def test_dig():
-        output = run_and_log_command(['dig', 'github.com'], context="Test dig command")
-        if output:
-            print("dig output captured")
+    def test_resolve():
+        records = resolve_and_log('github.com', context="Test DNS lookup")
+        if records:
+            print("DNS answer captured")
         else:
-            print("dig command failed")
+            print("DNS lookup failed")
 
     # Test functions
     sample_api_call()
-    test_dig()
+    test_resolve()
@@ -1,9 +1,20 @@
 #!/usr/bin/env python3
 import csv
+import ipaddress
 import json
 import os
-import subprocess
+import re
+import socket
 import sys
+from concurrent.futures import ThreadPoolExecutor
+import dns.exception
+import dns.resolver
+
+MAX_WORKERS = 32
+
+NS_PROVIDER_RE = re.compile(r'akam|azure|aws', re.IGNORECASE)
+# Checked in this order when a domain is delegated to more than one provider
+NS_PROVIDERS = {'akam': 'Akamai', 'azure': 'Azure', 'aws': 'AWS'}
 
 def load_config():
     """Load the DNS resolver configuration from ~/.ApiVault."""
@@ -16,28 +27,45 @@ def load_config():
         print(f"Error loading {vault_path}: {e}")
         return None
 
-def get_ns_owner(domain, resolver_ip):
+def make_resolver(resolver_host):
+    """
+    Build a resolver that only queries the configured DNS server.
+    Like `dig @server`, the server may be an IP address or a hostname.
+    """
+    try:
+        nameservers = [str(ipaddress.ip_address(resolver_host))]
+    except ValueError:
+        try:
+            infos = socket.getaddrinfo(resolver_host, 53, proto=socket.IPPROTO_UDP)
+        except socket.gaierror as e:
+            print(f"Could not resolve DNS resolver '{resolver_host}': {e}")
+            sys.exit(1)
+        nameservers = list(dict.fromkeys(info[4][0] for info in infos))
+    resolver = dns.resolver.Resolver(configure=False)
+    resolver.nameservers = nameservers
+    resolver.lifetime = 5
+    return resolver
+
+def get_ns_owner(domain, resolver):
     """
-    Perform a dig NS lookup and identify the provider.
+    Perform an NS lookup and identify the provider.
     Returns: Akamai, Azure, AWS, or Other.
     """
     if not domain:
         return "Other"
 
-    cmd = ["dig", f"@{resolver_ip}", "NS", domain, "+short"]
     try:
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=5)
-        output = result.stdout.lower()
-        
-        if "akam" in output:
-            return "Akamai"
-        elif "azure" in output:
-            return "Azure"
-        elif "aws" in output:
-            return "AWS"
-        else:
-            return "Other"
-    except subprocess.TimeoutExpired:
+        answer = resolver.resolve(domain, 'NS', raise_on_no_answer=False)
+        # Like 'dig +short', match against every record in the answer section:
+        # a CNAME chain (e.g. to an akamaiedge.net host) counts as well as the
+        # NS set at its end, which may be empty.
+        output = " ".join(rr.to_text() for rrset in answer.response.answer for rr in rrset)
+        matches = {m.lower() for m in NS_PROVIDER_RE.findall(output)}
+        return next((name for key, name in NS_PROVIDERS.items() if key in matches), "Other")
+    except (dns.resolver.NXDOMAIN, dns.resolver.NoAnswer, dns.resolver.NoNameservers):
+        # Same as an empty 'dig +short' answer (SERVFAIL included)
+        return "Other"
+    except dns.exception.Timeout:
         print(f"Timeout querying DNS for {domain}")
         return "Other"
     except Exception as e:
@@ -51,6 +79,7 @@ def process_files():
         sys.exit(1)
         
     print(f"Using DNS Resolver: {resolver_ip}")
+    resolver = make_resolver(resolver_ip)
 
     input_files = [
         {"path": "data/digicert_domains.csv", "provider": "Digicert"},
@@ -65,12 +94,14 @@ def process_files():
         path = file_info["path"]
         provider = file_info["provider"]
         
-        if not os.path.exists(path):
+        try:
+            csvfile = open(path, 'r', newline='')
+        except FileNotFoundError:
             print(f"Warning: {path} not found. Skipping.")
             continue
 
         print(f"Processing {path}...")
-        with open(path, 'r', newline='') as csvfile:
+        with csvfile:
             reader = csv.DictReader(csvfile)
             if not fieldnames:
                 fieldnames = reader.fieldnames
@@ -80,16 +111,24 @@ def process_files():
             
             for row in reader:
                 row['provider'] = provider
-                # Strip unexpected whitespace from domain just in case
-                domain = row.get('name', '').strip()
-                owner = get_ns_owner(domain, resolver_ip)
-                row['ns_provider'] = owner
                 combined_data.append(row)
 
     if not combined_data:
         print("No data found to combine.")
         return
 
+    # Resolve NS ownership once per unique domain; the same name often
+    # appears under both CAs.
+    # Strip unexpected whitespace from domain just in case
+    domains = list(dict.fromkeys(row.get('name', '').strip() for row in combined_data))
+    print(f"Resolving NS for {len(domains)} unique domains ({MAX_WORKERS} concurrent lookups)...")
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        owners = executor.map(lambda d: get_ns_owner(d, resolver), domains)
+        ns_owners = dict(zip(domains, owners))
+
+    for row in combined_data:
+        row['ns_provider'] = ns_owners[row.get('name', '').strip()]
+
     # Prepare output
     output_headers = ['provider'] + fieldnames + ['ns_provider']
     output_path = "data/combined_domains.csv"
@@ -3,7 +3,9 @@ import requests
 import json
 import csv
 import os
+import random
 import sys
+import time
 
 # Configuration
 DATA_DIR = "data"
@@ -11,17 +13,30 @@ INPUT_CSV = os.path.join(DATA_DIR, "domain_id_lookup.csv")
 OUTPUT_FILE = os.path.join(DATA_DIR, "sectigo_domains.csv")
 API_VAULT_PATH = os.path.expanduser('~/.ApiVault')
 SECTIGO_BASE_URL = "https://cert-manager.com/api/domain/v1/"
+# Detail responses are reused across reruns for up to an hour
+CACHE_FILE = os.path.join(DATA_DIR, ".sectigo_details_cache.json")
+CACHE_TTL_SECONDS = 3600
+FLUSH_EVERY = 25  # rows written between explicit flushes of the output CSV
+REQUEST_TIMEOUT = (3, 10)  # (connect, read) seconds
+MAX_ATTEMPTS = 5
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+OUTPUT_COLUMNS = ['id', 'name', 'active', 'dcv_method', 'Expiration']
+
+# Shared keep-alive session so each domain lookup reuses the TLS connection.
+# Retries are handled by get_with_retry, so the default adapter is enough.
+SESSION = requests.Session()
+SESSION.headers.update({'Accept': 'application/json'})
 
 def ensure_datadir():
-    if not os.path.exists(DATA_DIR):
-        os.makedirs(DATA_DIR)
+    os.makedirs(DATA_DIR, exist_ok=True)
 
 def load_credentials():
-    if not os.path.exists(API_VAULT_PATH):
+    try:
+        with open(API_VAULT_PATH, 'r') as f:
+            data = json.load(f)
+    except FileNotFoundError:
         print(f"Error: API vault not found at {API_VAULT_PATH}")
         sys.exit(1)
-    with open(API_VAULT_PATH, 'r') as f:
-        data = json.load(f)
     
     sectigo = data.get('Sectigo')
     if not sectigo:
@@ -44,19 +59,35 @@ def load_credentials():
         
     return login, password, customer_uri
 
-def get_domain_details(domain_id, login, password, customer_uri):
+def get_with_retry(url):
+    """
+    GET with exponential backoff plus jitter on 429/5xx and connection errors.
+    Honors a Retry-After header (in seconds) when the server sends one.
+    """
+    for attempt in range(MAX_ATTEMPTS):
+        last_attempt = attempt == MAX_ATTEMPTS - 1
+        resp = None
+        try:
+            resp = SESSION.get(url, timeout=REQUEST_TIMEOUT)
+        except (requests.ConnectionError, requests.Timeout):
+            if last_attempt:
+                raise
+        if resp is not None and (resp.status_code not in RETRY_STATUSES or last_attempt):
+            return resp
+
+        delay = min(0.5 * 2 ** attempt, 30) + random.uniform(0, 0.5)
+        retry_after = resp.headers.get('Retry-After', '') if resp is not None else ''
+        if retry_after.isdigit():
+            delay = min(int(retry_after), 30)
+        time.sleep(delay)
+
+def get_domain_details(domain_id):
     # Using V1 API: GET https://cert-manager.com/api/domain/v1/{id}
+    # Auth headers are set once on SESSION in main()
     url = f"{SECTIGO_BASE_URL}{domain_id}"
-    headers = {
-        'login': login,
-        'password': password,
-        'customerUri': customer_uri,
-        'Content-Type': 'application/json',
-        'Accept': 'application/json'
-    }
     
     try:
-        resp = requests.get(url, headers=headers)
+        resp = get_with_retry(url)
         if resp.status_code == 200:
             return resp.json()
         elif resp.status_code == 404:
@@ -70,97 +101,159 @@ def get_domain_details(domain_id, login, password, customer_uri):
         print(f"Error fetching details for ID {domain_id}: {e}")
         return None
 
-def read_lookup_csv():
-    if not os.path.exists(INPUT_CSV):
+def load_details_cache():
+    """Returns cached detail responses that are still within CACHE_TTL_SECONDS."""
+    try:
+        with open(CACHE_FILE, 'r') as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    cutoff = time.time() - CACHE_TTL_SECONDS
+    return {d_id: entry for d_id, entry in cache.items() if entry.get('fetched', 0) >= cutoff}
+
+def save_details_cache(cache):
+    try:
+        with open(CACHE_FILE, 'w') as f:
+            json.dump(cache, f)
+    except OSError as e:
+        print(f"Warning: Could not write cache {CACHE_FILE}: {e}")
+
+def load_done_ids():
+    """
+    Returns the IDs already written to OUTPUT_FILE by an earlier, interrupted run.
+    A partial last line left by a hard kill is truncated so appended rows start
+    on a fresh line, and only complete rows count as done.
+    """
+    try:
+        with open(OUTPUT_FILE, 'r+b') as f:
+            content = f.read()
+            end = content.rfind(b'\n') + 1
+            if end < len(content):
+                f.truncate(end)
+                content = content[:end]
+    except OSError:
+        return set()
+    try:
+        lines = content.decode('utf-8').splitlines()
+    except UnicodeDecodeError:
+        print(f"Warning: {OUTPUT_FILE} is not valid UTF-8; starting a fresh file.")
+        return set()
+    reader = csv.reader(lines)
+    next(reader, None)  # header; id is the first column
+    return {row[0] for row in reader if len(row) == len(OUTPUT_COLUMNS) and row[0]}
+
+def iter_lookup_rows():
+    """Yields (id, domain) for the Sectigo rows of the lookup CSV as they are parsed."""
+    try:
+        f = open(INPUT_CSV, 'r', encoding='utf-8')
+    except FileNotFoundError:
         print(f"Error: Input file {INPUT_CSV} not found.")
         sys.exit(1)
-    
-    domains_to_check = []
-    with open(INPUT_CSV, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
+    with f:
+        reader = csv.reader(f)
+        # Expected schema: id,domain,CA
+        header = next(reader, [])
+        try:
+            id_idx, dom_idx, ca_idx = header.index('id'), header.index('domain'), header.index('CA')
+        except ValueError as e:
+            print(f"Error: Missing column in {INPUT_CSV}: {e}")
+            sys.exit(1)
+        width = max(id_idx, dom_idx, ca_idx)
         for row in reader:
-            # Expected schema: id,domain,CA
-            ca = row.get('CA', '').strip()
-            if ca.lower() == 'sectigo':
-                domains_to_check.append(row)
-    return domains_to_check
+            if len(row) > width and row[ca_idx].strip().lower() == 'sectigo':
+                yield row[id_idx], row[dom_idx]
+
+SECTIGO_METHOD_MAP = {
+    'CNAME_CSR_HASH': 'CNAME',
+    'EMAIL': 'EMAIL',
+    'DNSTXT_RANDOM_VALUE': 'TXT'
+}
 
 def map_sectigo_method(method_str):
     if not method_str:
         return 'OTHER'
-    
-    m = method_str.upper()
-    if m == 'CNAME_CSR_HASH':
-        return 'CNAME'
-    elif m == 'EMAIL':
-        return 'EMAIL'
-    elif m == 'DNSTXT_RANDOM_VALUE':
-        return 'TXT'
-    else:
-        return method_str
+    return SECTIGO_METHOD_MAP.get(method_str.upper(), method_str)
 
 def main():
     ensure_datadir()
     login, password, customer_uri = load_credentials()
+    SESSION.headers.update({
+        'login': login,
+        'password': password,
+        'customerUri': customer_uri,
+        'Content-Type': 'application/json'
+    })
     
-    domains_list = read_lookup_csv()
-    print(f"Found {len(domains_list)} Sectigo domains in lookup CSV.")
-    
-    final_data = []
-    
-    # Output Header: id,name,active,dcv_method,Expiration
+    print(f"Reading Sectigo domains from {INPUT_CSV}...")
+    print(f"Writing results to {OUTPUT_FILE}...")
+    written_count = 0
+
+    # Resume an interrupted run and reuse cached details unless --force asks
+    # for a fresh file with every domain fetched again
+    force = '--force' in sys.argv[1:]
+    cache = {} if force else load_details_cache()
+    done_ids = set() if force else load_done_ids()
+    if done_ids:
+        print(f"Resuming: {len(done_ids)} domains already in {OUTPUT_FILE} (use --force to start over and refetch all details).")
+    # The lookup CSV can list an ID more than once; fetch each ID only once.
+    seen_ids = set(done_ids)
     
-    for entry in domains_list:
-        d_id = entry.get('id')
-        d_name_csv = entry.get('domain')
-        
-        if not d_id:
-            continue
-            
-        print(f"Fetching details for ID {d_id} ({d_name_csv})...")
-        details = get_domain_details(d_id, login, password, customer_uri)
-        
-        if details:
-            # Parse fields based on V1 response
-            
-            # Active status: Check 'state'
-            # "Return for state should be for the active column"
-            state = details.get('state', '')
-            # If state is "ACTIVE", we put "ACTIVE". If it's something else, we put that.
-            # Digicert was "ACTIVE" or empty. User said "Return for state should be for the active column".
-            # Assuming if state is "ACTIVE" -> "ACTIVE".
-            active_str = state if state else ""
-            
-            # Expiration
-            # "dcvExpiration should go in Expiration"
-            expiration_date = details.get('dcvExpiration', '')
-            
-            # DCV Method
-            # "validationMethod conversion..."
-            raw_method = details.get('validationMethod')
-            dcv_method_str = map_sectigo_method(raw_method)
-            
-            # Name
-            api_name = details.get('name') or d_name_csv
-            
-            final_data.append({
-                'id': d_id,
-                'name': api_name,
-                'active': active_str,
-                'dcv_method': dcv_method_str,
-                'Expiration': expiration_date
-            })
-        else:
-            print(f"Skipping {d_id} due to API error/missing data.")
+    # Rows are written as soon as they are parsed so an interrupted run
+    # keeps everything fetched so far.
+    with open(OUTPUT_FILE, 'a' if done_ids else 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        if not done_ids:
+            writer.writerow(OUTPUT_COLUMNS)
 
-    print(f"Writing results to {OUTPUT_FILE}...")
-    with open(OUTPUT_FILE, 'w', newline='', encoding='utf-8') as f:
-        fieldnames = ['id', 'name', 'active', 'dcv_method', 'Expiration']
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        writer.writeheader()
-        for row in final_data:
-            writer.writerow(row)
-            
+        try:
+            for d_id, d_name_csv in iter_lookup_rows():
+                if not d_id or d_id in seen_ids:
+                    continue
+                seen_ids.add(d_id)
+                    
+                cached = cache.get(d_id)
+                if cached:
+                    details = cached['data']
+                else:
+                    print(f"Fetching details for ID {d_id} ({d_name_csv})...")
+                    details = get_domain_details(d_id)
+                    if details:
+                        cache[d_id] = {'fetched': time.time(), 'data': details}
+                
+                if not details:
+                    print(f"Skipping {d_id} due to API error/missing data.")
+                    continue
+
+                # Parse fields based on V1 response
+                
+                # Active status: Check 'state'
+                # "Return for state should be for the active column"
+                state = details.get('state', '')
+                # If state is "ACTIVE", we put "ACTIVE". If it's something else, we put that.
+                # Digicert was "ACTIVE" or empty. User said "Return for state should be for the active column".
+                # Assuming if state is "ACTIVE" -> "ACTIVE".
+                active_str = state if state else ""
+                
+                # Expiration
+                # "dcvExpiration should go in Expiration"
+                expiration_date = details.get('dcvExpiration', '')
+                
+                # DCV Method
+                # "validationMethod conversion..."
+                raw_method = details.get('validationMethod')
+                dcv_method_str = map_sectigo_method(raw_method)
+                
+                # Name
+                api_name = details.get('name') or d_name_csv
+                
+                writer.writerow([d_id, api_name, active_str, dcv_method_str, expiration_date])
+                written_count += 1
+                if written_count % FLUSH_EVERY == 0:
+                    f.flush()
+        finally:
+            save_details_cache(cache)
+
+    print(f"Wrote {written_count} Sectigo domains to {OUTPUT_FILE}.")
     print("Done.")
 
 if __name__ == "__main__":